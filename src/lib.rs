@@ -1,7 +1,8 @@
 use std::{
-    fs::{create_dir_all, read_to_string, set_permissions, File, Permissions},
-    io::{self, Cursor, Write},
-    os::unix::fs::PermissionsExt,
+    collections::BTreeSet,
+    fs::{create_dir_all, read_to_string, File, OpenOptions},
+    io::{self, BufWriter, Cursor, ErrorKind, Read, Seek, Write},
+    os::unix::fs::OpenOptionsExt,
     path::{Path, PathBuf},
 };
 
@@ -12,8 +13,19 @@ use rayon::iter::{IntoParallelIterator, ParallelIterator};
 use regex::Regex;
 use zip::ZipArchive;
 
-const RE_GITHUB_PATTERN: &str = r"(?xi)^(?:https?://github\.com/|git@github\.com:|ssh://git@github\.com/)([^/]+)/([^/]+?)(?:\.git)?(?:/|$)";
+const RE_GITHUB_PATTERN: &str = r"(?xi)^(?:https?://github\.com/|git@github\.com:|ssh://git@github\.com/)(?P<owner>[^/]+)/(?P<repo>[^/]+?)(?:\.git)?(?:/|$)";
+const GITHUB_URL_PREFIXES: [&str; 4] = [
+    "https://github.com/",
+    "http://github.com/",
+    "git@github.com:",
+    "ssh://git@github.com/",
+];
 const PARALLEL_THRESHOLD_BYTES: u64 = 10_485_760; // 10 MB
+const PARALLEL_MIN_ENTRIES: usize = 32;
+const ENTRY_BUF_SIZE: usize = 256 * 1024;
+
+static RE_GITHUB: Lazy<Regex> =
+    Lazy::new(|| Regex::new(RE_GITHUB_PATTERN).unwrap());
 
 #[derive(Debug)]
 pub struct MemEntry {
@@ -25,46 +37,107 @@ pub struct MemEntry {
     pub data:       Vec<u8>,
 }
 
-pub fn parse_github_url(url: &str) -> Result<(String, String), &'static str> {
-    static RE_GITHUB: Lazy<Regex> =
-        Lazy::new(|| Regex::new(RE_GITHUB_PATTERN).unwrap());
+struct EntryMeta {
+    rel_path:  PathBuf,
+    unix_mode: Option<u32>,
+    size:      u64,
+    index:     usize,
+}
 
+pub fn parse_github_url(url: &str) -> Result<(String, String), &'static str> {
     let trimmed = url.trim();
     let stripped = trimmed.strip_suffix(".git").unwrap_or(trimmed);
 
+    if let Some((owner, repo)) = parse_github_url_fast(stripped) {
+        return Ok((owner.to_string(), repo.to_string()));
+    }
+
     if let Some(caps) = RE_GITHUB.captures(stripped) {
-        let owner = caps.get(1).unwrap().as_str().to_string();
-        let repo = caps.get(2).unwrap().as_str().to_string();
-        Ok((owner, repo))
+        Ok((caps["owner"].to_string(), caps["repo"].to_string()))
     } else {
         Err("Invalid GitHub URL")
     }
 }
 
+fn parse_github_url_fast(url: &str) -> Option<(&str, &str)> {
+    let rest = GITHUB_URL_PREFIXES.iter().find_map(|p| url.strip_prefix(p))?;
+    let (owner, tail) = rest.split_once('/')?;
+    let repo = strip_git_suffix(tail.split('/').next().unwrap_or(tail));
+
+    if owner.is_empty() || repo.is_empty() {
+        None
+    } else {
+        Some((owner, repo))
+    }
+}
+
+fn strip_git_suffix(name: &str) -> &str {
+    let bytes = name.as_bytes();
+
+    let suffix_at = bytes.len().saturating_sub(4);
+
+    if bytes.len() >= 4 && bytes[suffix_at..].eq_ignore_ascii_case(b".git") {
+        &name[..suffix_at]
+    } else {
+        name
+    }
+}
+
 pub fn write_entry(entry: &MemEntry, dest_dir: &Path) -> anyhow::Result<()> {
     let outpath = dest_dir.join(&entry.rel_path);
 
     if entry.is_dir {
         create_dir_all(&outpath)?;
     } else {
-        if let Some(parent) = outpath.parent() {
-            create_dir_all(parent)?;
-        }
-        let mut outfile = File::create(&outpath)?;
+        let mut outfile = match create_entry_file(&outpath, entry.unix_mode) {
+            Err(e) if e.kind() == ErrorKind::NotFound => {
+                if let Some(parent) = outpath.parent() {
+                    create_dir_all(parent)?;
+                }
+                create_entry_file(&outpath, entry.unix_mode)?
+            },
+            res => res?,
+        };
         outfile.write_all(&entry.data)?;
-
-        #[cfg(unix)]
-        if let Some(mode) = entry.unix_mode {
-            let _ = set_permissions(&outpath, Permissions::from_mode(mode));
-        }
     }
     Ok(())
 }
 
-pub fn extract_zip(zip_path: &Path, dest_dir: &Path) -> anyhow::Result<()> {
-    let f = File::open(zip_path)?;
-    let mmap = unsafe { MmapOptions::new().map(&f)? };
-    let cursor = Cursor::new(&mmap[..]);
+fn create_entry_file(
+    outpath: &Path,
+    unix_mode: Option<u32>,
+) -> io::Result<File> {
+    let mut options = OpenOptions::new();
+    options.write(true).create(true).truncate(true);
+
+    #[cfg(unix)]
+    if let Some(mode) = unix_mode {
+        options.mode(mode & 0o777);
+    }
+
+    options.open(outpath)
+}
+
+pub fn extract_zip(
+    zip_path: &Path,
+    dest_dir: &Path,
+) -> anyhow::Result<Vec<PathBuf>> {
+    extract_zip_file(&File::open(zip_path)?, dest_dir)
+}
+
+pub fn extract_zip_file(
+    f: &File,
+    dest_dir: &Path,
+) -> anyhow::Result<Vec<PathBuf>> {
+    let mmap = unsafe { MmapOptions::new().map(f)? };
+    extract_zip_bytes(&mmap, dest_dir)
+}
+
+pub fn extract_zip_bytes(
+    data: &[u8],
+    dest_dir: &Path,
+) -> anyhow::Result<Vec<PathBuf>> {
+    let cursor = Cursor::new(data);
     let mut archive = ZipArchive::new(cursor)?;
     let len = archive.len();
 
@@ -74,95 +147,124 @@ pub fn extract_zip(zip_path: &Path, dest_dir: &Path) -> anyhow::Result<()> {
 
     create_dir_all(dest_dir)?;
 
-    let mut entries: Vec<MemEntry> = Vec::with_capacity(len);
-    let mut root_prefix: Option<PathBuf> = None;
-    let mut root_mismatch = false;
+    let mut entries: Vec<EntryMeta> = Vec::with_capacity(len);
+    let mut dirs: BTreeSet<PathBuf> = BTreeSet::new();
+    let root = common_root(archive.file_names()).map(PathBuf::from);
     let mut total_size: u64 = 0;
 
     for i in 0..len {
-        let mut file = archive.by_index(i)?;
+        let file = archive.by_index_raw(i)?;
 
         let in_path = file
             .enclosed_name()
             .map(|p| p.to_path_buf())
             .unwrap_or_else(|| PathBuf::from(file.name()));
 
-        if !root_mismatch {
-            if let Some(first) = in_path.components().next() {
-                let first_str = first.as_os_str().to_string_lossy();
-                if first_str.is_empty() {
-                    root_mismatch = true;
-                } else if let Some(ref current_prefix) = root_prefix {
-                    if current_prefix.as_os_str() != first.as_os_str() {
-                        root_mismatch = true;
-                    }
-                } else {
-                    root_prefix = Some(PathBuf::from(first.as_os_str()));
-                }
-            } else {
-                root_mismatch = true;
-            }
-        }
-
-        let rel_path = if !root_mismatch {
-            if let Some(ref root) = root_prefix {
-                match in_path.strip_prefix(root) {
-                    Ok(p) => p.to_path_buf(),
-                    Err(_) => {
-                        root_mismatch = true;
-                        in_path.clone()
-                    },
-                }
-            } else {
-                in_path.clone()
-            }
-        } else {
-            in_path.clone()
+        let rel_path = match root {
+            Some(ref root) => in_path
+                .strip_prefix(root)
+                .map(|p| p.to_path_buf())
+                .unwrap_or(in_path),
+            None => in_path,
         };
 
         if rel_path.as_os_str().is_empty() {
             continue;
         }
 
-        let is_dir = file.name().ends_with('/');
-        let unix_mode = file.unix_mode();
+        if rel_path.components().any(|c| c.as_os_str() == ".git") {
+            continue;
+        }
+
+        if file.name().ends_with('/') {
+            dirs.insert(rel_path);
+            continue;
+        }
 
-        let (data_size, data) = if is_dir {
-            (0, Vec::new())
-        } else {
-            let size = file.size();
-            let mut buf = Vec::with_capacity(size as usize);
-            io::copy(&mut file, &mut buf)?;
-            (size, buf)
-        };
+        if let Some(parent) = rel_path.parent() {
+            if !parent.as_os_str().is_empty() && !dirs.contains(parent) {
+                dirs.insert(parent.to_path_buf());
+            }
+        }
 
+        let data_size = file.size();
         total_size += data_size;
 
-        entries.push(MemEntry {
+        entries.push(EntryMeta {
             rel_path,
-            is_dir,
-            _data_size: data_size,
-            unix_mode,
-            _file_idx: i,
-            data,
+            unix_mode: file.unix_mode(),
+            size: data_size,
+            index: i,
         });
     }
 
-    if total_size > PARALLEL_THRESHOLD_BYTES {
-        entries.into_par_iter().try_for_each(
-            |entry| -> anyhow::Result<()> { write_entry(&entry, dest_dir) },
+    for dir in &dirs {
+        create_dir_all(dest_dir.join(dir))?;
+    }
+
+    let mut written: Vec<PathBuf> =
+        entries.iter().map(|e| e.rel_path.clone()).collect();
+    written.sort_unstable_by(|a, b| a.as_os_str().cmp(b.as_os_str()));
+
+    if entries.len() >= PARALLEL_MIN_ENTRIES
+        || total_size > PARALLEL_THRESHOLD_BYTES
+    {
+        entries.into_par_iter().try_for_each_init(
+            || archive.clone(),
+            |archive, entry| extract_entry(archive, &entry, dest_dir),
         )?;
     } else {
         for entry in entries {
-            write_entry(&entry, dest_dir)?;
+            extract_entry(&mut archive, &entry, dest_dir)?;
         }
     }
 
+    Ok(written)
+}
+
+fn common_root<'a>(names: impl Iterator<Item = &'a str>) -> Option<&'a str> {
+    let mut root = None;
+
+    for name in names {
+        let (first, _) = name.split_once('/')?;
+
+        match root {
+            _ if first.is_empty() => return None,
+            Some(r) if r != first => return None,
+            _ => root = Some(first),
+        }
+    }
+
+    root
+}
+
+fn extract_entry<R: Read + Seek>(
+    archive: &mut ZipArchive<R>,
+    entry: &EntryMeta,
+    dest_dir: &Path,
+) -> anyhow::Result<()> {
+    let outpath = dest_dir.join(&entry.rel_path);
+    let mut file = archive.by_index(entry.index)?;
+    let capacity = (entry.size as usize).clamp(1, ENTRY_BUF_SIZE);
+    let mut outfile = BufWriter::with_capacity(
+        capacity,
+        create_entry_file(&outpath, entry.unix_mode)?,
+    );
+    io::copy(&mut file, &mut outfile)?;
+    outfile.flush()?;
+
     Ok(())
 }
 
 #[cfg(test)]
 mod tests {
+    use std::{
+        fs::{metadata, read},
+        os::unix::fs::PermissionsExt,
+    };
+
+    use zip::{write::SimpleFileOptions, ZipWriter};
+
     use super::*;
 
     #[test]
@@ -213,6 +315,14 @@ mod tests {
         assert_eq!(repo, "repo");
     }
 
+    #[test]
+    fn test_parse_github_url_with_subpath() {
+        let url = "https://github.com/user/repo/tree/main/src";
+        let (owner, repo) = parse_github_url(url).unwrap();
+        assert_eq!(owner, "user");
+        assert_eq!(repo, "repo");
+    }
+
     #[test]
     fn test_parse_github_url_with_whitespace() {
         let url = "  https://github.com/user/repo  ";
@@ -241,6 +351,56 @@ mod tests {
         assert_eq!(repo, "repo");
     }
 
+    #[test]
+    fn test_parse_github_url_uppercase_git_suffix() {
+        let url = "https://github.com/user/repo.GIT";
+        let (owner, repo) = parse_github_url(url).unwrap();
+        assert_eq!(owner, "user");
+        assert_eq!(repo, "repo");
+    }
+
+    #[test]
+    fn test_parse_github_url_fast_path_matches_regex() {
+        let regex_only = |url: &str| {
+            let trimmed = url.trim();
+            let stripped = trimmed.strip_suffix(".git").unwrap_or(trimmed);
+
+            RE_GITHUB
+                .captures(stripped)
+                .map(|caps| {
+                    (caps["owner"].to_string(), caps["repo"].to_string())
+                })
+                .ok_or("Invalid GitHub URL")
+        };
+
+        let canonical = [
+            "https://github.com/user/repo",
+            "http://github.com/user/repo/",
+            "https://github.com/user/repo.git/tree/main",
+        ];
+
+        for url in canonical {
+            let fast = parse_github_url_fast(url)
+                .map(|(owner, repo)| (owner.to_string(), repo.to_string()));
+
+            assert!(fast.is_some(), "fast path missed {}", url);
+            assert_eq!(fast.ok_or("Invalid GitHub URL"), regex_only(url));
+        }
+
+        let others = [
+            "https://github.com/user/repo.git.git",
+            "https://github.com/user/.git/",
+            "https://github.com/user/",
+            "https://github.com//repo",
+            "git@github.com:user/repo",
+            "ssh://git@github.com/user/repo.Git",
+        ];
+
+        for url in others {
+            assert_eq!(parse_github_url(url), regex_only(url), "{}", url);
+        }
+    }
+
     #[test]
     fn test_write_entry_file() {
         let temp_dir = tempfile::tempdir().unwrap();
@@ -285,6 +445,26 @@ mod tests {
         assert_eq!(content, "hello");
     }
 
+    #[test]
+    fn test_write_entry_executable_mode() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let dest = temp_dir.path();
+
+        let entry = MemEntry {
+            rel_path:   PathBuf::from("run.sh"),
+            is_dir:     false,
+            _data_size: 9,
+            unix_mode:  Some(0o100755),
+            _file_idx:  0,
+            data:       b"#!/bin/sh".to_vec(),
+        };
+
+        write_entry(&entry, dest).unwrap();
+
+        let mode = metadata(dest.join("run.sh")).unwrap().permissions().mode();
+        assert_ne!(mode & 0o111, 0);
+    }
+
     #[test]
     fn test_write_entry_directory() {
         let temp_dir = tempfile::tempdir().unwrap();
@@ -320,4 +500,147 @@ mod tests {
         assert!(debug_str.contains("test.txt"));
         assert!(debug_str.contains("false"));
     }
+
+    fn build_zip(path: &Path, entries: &[(&str, &str)]) {
+        let mut writer = ZipWriter::new(File::create(path).unwrap());
+
+        for (name, data) in entries {
+            if name.ends_with('/') {
+                writer
+                    .add_directory(*name, SimpleFileOptions::default())
+                    .unwrap();
+            } else {
+                writer.start_file(*name, SimpleFileOptions::default()).unwrap();
+                writer.write_all(data.as_bytes()).unwrap();
+            }
+        }
+
+        writer.finish().unwrap();
+    }
+
+    #[test]
+    fn test_extract_zip_strips_root_prefix() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let zip_path = temp_dir.path().join("archive.zip");
+        let dest = temp_dir.path().join("out");
+
+        build_zip(
+            &zip_path,
+            &[
+                ("user-repo-abc123/", ""),
+                ("user-repo-abc123/README.md", "readme"),
+                ("user-repo-abc123/src/main.rs", "fn main() {}"),
+            ],
+        );
+
+        extract_zip(&zip_path, &dest).unwrap();
+
+        assert_eq!(read_to_string(dest.join("README.md")).unwrap(), "readme");
+        assert_eq!(
+            read_to_string(dest.join("src/main.rs")).unwrap(),
+            "fn main() {}"
+        );
+        assert!(!dest.join("user-repo-abc123").exists());
+    }
+
+    #[test]
+    fn test_extract_zip_keeps_paths_without_common_root() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let zip_path = temp_dir.path().join("archive.zip");
+        let dest = temp_dir.path().join("out");
+
+        build_zip(
+            &zip_path,
+            &[
+                ("docs/guide.md", "guide"),
+                ("src/main.rs", "fn main() {}"),
+                ("README.md", "readme"),
+            ],
+        );
+
+        extract_zip(&zip_path, &dest).unwrap();
+
+        assert_eq!(
+            read_to_string(dest.join("docs/guide.md")).unwrap(),
+            "guide"
+        );
+        assert_eq!(
+            read_to_string(dest.join("src/main.rs")).unwrap(),
+            "fn main() {}"
+        );
+        assert_eq!(read_to_string(dest.join("README.md")).unwrap(), "readme");
+    }
+
+    #[test]
+    fn test_extract_zip_bytes() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let zip_path = temp_dir.path().join("archive.zip");
+        let dest = temp_dir.path().join("out");
+
+        build_zip(
+            &zip_path,
+            &[
+                ("user-repo-abc123/README.md", "readme"),
+                ("user-repo-abc123/docs/guide.md", "guide"),
+            ],
+        );
+
+        let data = read(&zip_path).unwrap();
+        let written = extract_zip_bytes(&data, &dest).unwrap();
+
+        assert_eq!(
+            written,
+            vec![PathBuf::from("README.md"), PathBuf::from("docs/guide.md")]
+        );
+
+        assert_eq!(read_to_string(dest.join("README.md")).unwrap(), "readme");
+        assert_eq!(
+            read_to_string(dest.join("docs/guide.md")).unwrap(),
+            "guide"
+        );
+    }
+
+    #[test]
+    fn test_extract_zip_many_entries_parallel() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let zip_path = temp_dir.path().join("archive.zip");
+        let dest = temp_dir.path().join("out");
+        let names: Vec<String> = (0..PARALLEL_MIN_ENTRIES * 2)
+            .map(|i| format!("user-repo-abc123/src/file{}.txt", i))
+            .collect();
+        let files: Vec<(&str, &str)> =
+            names.iter().map(|n| (n.as_str(), "content")).collect();
+
+        build_zip(&zip_path, &files);
+        extract_zip(&zip_path, &dest).unwrap();
+
+        for i in 0..PARALLEL_MIN_ENTRIES * 2 {
+            let path = dest.join(format!("src/file{}.txt", i));
+            assert_eq!(read_to_string(path).unwrap(), "content");
+        }
+    }
+
+    #[test]
+    fn test_extract_zip_skips_embedded_git() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let zip_path = temp_dir.path().join("archive.zip");
+        let dest = temp_dir.path().join("out");
+
+        build_zip(
+            &zip_path,
+            &[
+                ("user-repo-abc123/README.md", "readme"),
+                ("user-repo-abc123/.git/config", "[core]"),
+                ("user-repo-abc123/vendor/lib/.git/HEAD", "ref"),
+                ("user-repo-abc123/vendor/lib/lib.rs", "lib"),
+            ],
+        );
+
+        extract_zip(&zip_path, &dest).unwrap();
+
+        assert!(dest.join("README.md").exists());
+        assert!(dest.join("vendor/lib/lib.rs").exists());
+        assert!(!dest.join(".git").exists());
+        assert!(!dest.join("vendor/lib/.git").exists());
+    }
 }
@@ -1,23 +1,37 @@
 use std::{
-    env::var,
-    fs::{remove_dir_all, File},
-    io::{self, stdin, stdout, Write},
+    env::{split_paths, var, var_os},
+    error::Error,
+    fmt,
+    fs::{
+        create_dir_all, read_to_string, remove_dir, remove_dir_all,
+        remove_file, rename, write, File,
+    },
+    io::{
+        self, stdin, stdout, BufWriter, ErrorKind, Read, Seek, SeekFrom, Write,
+    },
+    os::unix::fs::PermissionsExt,
     path::{Path, PathBuf},
-    process::{exit, Command, Stdio},
+    process::{exit, id},
+    thread::{sleep, spawn, JoinHandle},
     time::{Duration, SystemTime},
 };
 
 use anyhow::anyhow;
 use clap::Parser;
-use git2::{IndexAddOption, Repository, Signature};
-use gitripper::{extract_zip, parse_github_url};
-use ignore::{DirEntry, Error, WalkBuilder, WalkState};
+use git2::{opts, Direction, ProxyOptions, Remote, Repository, Signature};
+use gitripper::{extract_zip_bytes, extract_zip_file, parse_github_url};
 use once_cell::sync::Lazy;
 use phf::{phf_map, Map};
-use reqwest::blocking::Client;
-use serde_json::Value;
-use tempfile::tempdir;
-use WalkState::Continue;
+use rayon::iter::{ParallelBridge, ParallelIterator};
+use reqwest::{
+    blocking::{Client, RequestBuilder, Response},
+    header::{
+        HeaderMap, HeaderValue, ACCEPT, ACCEPT_ENCODING, AUTHORIZATION, ETAG,
+        IF_NONE_MATCH,
+    },
+};
+use serde_json::{json, Value};
+use tempfile::{tempfile, tempfile_in, NamedTempFile};
 
 const DEFAULT_BRANCH: &str = "main";
 const DEFAULT_COMMIT_MESSAGE: &str = "Initial commit";
@@ -25,9 +39,23 @@ const TIMEOUT_GET_REPO_SECS: u64 = 30;
 const TIMEOUT_DOWNLOAD_SECS: u64 = 60;
 const TIMEOUT_GET_REPO: Duration = Duration::from_secs(TIMEOUT_GET_REPO_SECS);
 const TIMEOUT_DOWNLOAD: Duration = Duration::from_secs(TIMEOUT_DOWNLOAD_SECS);
+const POOL_MAX_IDLE_PER_HOST: usize = 8;
+const TCP_KEEPALIVE: Duration = Duration::from_secs(60);
+const RETRY_ATTEMPTS: u32 = 3;
+const RETRY_BACKOFF: Duration = Duration::from_millis(300);
+const RETRY_STATUSES: [u16; 3] = [502, 503, 504];
+const ERROR_BODY_MAX: u64 = 256;
 const ACCEPT_HEADER: &str = "application/vnd.github+json";
-const ARCHIVE_PREFIX: &str = "archive-";
+const CACHE_DIR_NAME: &str = "gitripper";
+const REPO_META_CACHE_FILE: &str = "repo_meta.json";
+const REPO_META_TTL_SECS: u64 = 10 * 60;
+const DOWNLOAD_BUF_SIZE: usize = 1 << 20;
+const IN_MEMORY_ARCHIVE_MAX: u64 = 64 * 1024 * 1024;
 const GITHUB_API: &str = "https://api.github.com";
+const GITHUB_WEB: &str = "https://github.com";
+const GRAPHQL_DEFAULT_BRANCH_QUERY: &str =
+    "query($owner: String!, $name: String!) { repository(owner: $owner, name: \
+     $name) { defaultBranchRef { name } } }";
 const USER_AGENT: &str = BUILD_USER_AGENT;
 const ERR_INVALID_URL: i32 = 2;
 const ERR_DEST_EXISTS: i32 = 3;
@@ -67,12 +95,49 @@ static MIME_BY_EXT: Map<&'static str, &'static str> = phf_map! {
 static HTTP_CLIENT: Lazy<Client> = Lazy::new(|| {
     Client::builder()
         .user_agent(USER_AGENT)
+        .default_headers(HeaderMap::from_iter([(
+            ACCEPT,
+            HeaderValue::from_static(ACCEPT_HEADER),
+        )]))
+        .pool_max_idle_per_host(POOL_MAX_IDLE_PER_HOST)
+        .tcp_keepalive(TCP_KEEPALIVE)
         .build()
         .expect("failed to build global HTTP client")
 });
 
 fn get_client() -> &'static Client { &HTTP_CLIENT }
 
+fn send_with_retry(req: RequestBuilder) -> reqwest::Result<Response> {
+    for attempt in 0..RETRY_ATTEMPTS {
+        let Some(attempt_req) = req.try_clone() else {
+            break;
+        };
+
+        match attempt_req.send() {
+            Ok(res) if !RETRY_STATUSES.contains(&res.status().as_u16()) => {
+                return Ok(res);
+            },
+            Err(e) if !e.is_connect() => return Err(e),
+            _ => sleep(RETRY_BACKOFF * 2u32.pow(attempt)),
+        }
+    }
+
+    req.send()
+}
+
+fn authorize(req: RequestBuilder, token: Option<&str>) -> RequestBuilder {
+    match token {
+        Some(t) => req.header(AUTHORIZATION, format!("token {}", t)),
+        None => req,
+    }
+}
+
+fn error_body(res: Response) -> String {
+    let mut body = Vec::new();
+    let _ = res.take(ERROR_BODY_MAX).read_to_end(&mut body);
+    String::from_utf8_lossy(&body).into_owned()
+}
+
 fn touch_compile_items() {
     let _ = max_timeout_secs(1u64, 2u64);
     let _ = MAX_TIMEOUT_SECS;
@@ -120,6 +185,76 @@ struct Args {
 
     #[arg(long)]
     force: bool,
+
+    #[arg(long, value_name = "PATH")]
+    keep_archive: Option<PathBuf>,
+}
+
+enum Archive {
+    Memory(Vec<u8>),
+    File(File),
+}
+
+impl Archive {
+    fn extract_to(&self, dest: &Path) -> anyhow::Result<Vec<PathBuf>> {
+        match self {
+            Archive::Memory(data) => extract_zip_bytes(data, dest),
+            Archive::File(file) => extract_zip_file(file, dest),
+        }
+    }
+
+    fn save_to(&self, path: &Path) -> io::Result<()> {
+        match self {
+            Archive::Memory(data) => write(path, data),
+            Archive::File(file) => {
+                let mut src: &File = file;
+                src.seek(SeekFrom::Start(0))?;
+                io::copy(&mut src, &mut File::create(path)?).map(|_| ())
+            },
+        }
+    }
+}
+
+struct Cleanup {
+    path:        PathBuf,
+    blocks_dest: bool,
+    handle:      Option<JoinHandle<io::Result<()>>>,
+}
+
+impl Cleanup {
+    fn spawn(path: PathBuf, is_dir: bool, blocks_dest: bool) -> Self {
+        let target = path.clone();
+        // A swapped-aside tree is deleted while extraction runs on rayon's
+        // global pool, so only use the pool when the delete blocks dest.
+        let handle = spawn(move || match (is_dir, blocks_dest) {
+            (false, _) => remove_file(&target),
+            (true, false) => remove_dir_all(&target),
+            (true, true) => remove_dir_parallel(&target),
+        });
+
+        Cleanup {
+            path,
+            blocks_dest,
+            handle: Some(handle),
+        }
+    }
+
+    fn wait(mut self) -> io::Result<()> {
+        match self.handle.take() {
+            Some(h) => h.join().unwrap_or_else(|_| {
+                Err(io::Error::other("cleanup thread panicked"))
+            }),
+            None => Ok(()),
+        }
+    }
+}
+
+impl Drop for Cleanup {
+    fn drop(&mut self) {
+        if let Some(h) = self.handle.take() {
+            let _ = h.join();
+        }
+    }
 }
 
 fn main() {
@@ -141,35 +276,59 @@ fn run() -> Result<(), i32> {
         return Err(ERR_INVALID_URL);
     }
 
-    let dest = prepare_destination(&args, &repo)?;
     check_git_installed().map_err(|_| ERR_GIT_NOT_FOUND)?;
+    let (dest, mut cleanup) = prepare_destination(&args, &repo)?;
 
     let client = get_client();
 
     let reference =
         determine_reference(&args, &client, &owner, &repo, token.as_deref());
 
-    let tmp = tempdir().map_err(|_| ERR_DOWNLOAD_FAILED)?;
+    let spill_dir = match dest.parent() {
+        Some(p) if !p.as_os_str().is_empty() => p,
+        _ => Path::new("."),
+    };
 
-    let zip_path = download_archive(
+    let archive = download_archive(
         &client,
         &owner,
         &repo,
         &reference,
         token.as_deref(),
-        tmp.path(),
-    )?;
+        spill_dir,
+    );
+
+    if let Some(c) = cleanup.take_if(|c| c.blocks_dest) {
+        let path = c.path.clone();
+        c.wait().map_err(|e| {
+            eprintln!("Failed to remove '{}': {}", path.display(), e);
+            ERR_CLEANUP_FAILED
+        })?;
+    }
+
+    let archive = archive?;
 
-    extract_zip(&zip_path, &dest).map_err(|e| {
+    if let Some(path) = &args.keep_archive {
+        match archive.save_to(path) {
+            Ok(()) => println!("Saved archive to {}", path.display()),
+            Err(e) => eprintln!(
+                "Warning: could not save archive to '{}': {}",
+                path.display(),
+                e
+            ),
+        }
+    }
+
+    let paths = archive.extract_to(&dest).map_err(|e| {
         eprintln!("Failed to extract archive: {}", e);
         ERR_EXTRACTION_FAILED
     })?;
 
-    remove_embedded_git(&dest);
     println!("Initializing new git repository...");
 
     initialize_repo(
         &dest,
+        &paths,
         args.author_name.as_deref(),
         args.author_email.as_deref(),
         args.remote.as_deref(),
@@ -179,6 +338,18 @@ fn run() -> Result<(), i32> {
         ERR_INIT_FAILED
     })?;
 
+    if let Some(c) = cleanup {
+        let path = c.path.clone();
+
+        if let Err(e) = c.wait() {
+            eprintln!(
+                "Warning: could not remove old destination '{}': {}",
+                path.display(),
+                e
+            );
+        }
+    }
+
     println!("Done. Repository copied to: {}", dest.display());
     println!("Note: this repository has no history from the original repo.");
     Ok(())
@@ -196,31 +367,64 @@ fn read_url_from_args(args: &Args) -> Result<String, i32> {
     }
 }
 
-fn prepare_destination(args: &Args, repo: &str) -> Result<PathBuf, i32> {
+fn prepare_destination(
+    args: &Args,
+    repo: &str,
+) -> Result<(PathBuf, Option<Cleanup>), i32> {
     let dest = args
         .dest
         .clone()
         .unwrap_or_else(|| PathBuf::from(format!("{}-copy", repo)));
 
-    if dest.exists() {
-        let not_empty =
-            dest.read_dir().map(|mut rd| rd.next().is_some()).unwrap_or(false);
+    let (not_empty, is_dir) = match dest.read_dir() {
+        Ok(mut rd) => (rd.next().is_some(), true),
+        Err(e) if e.kind() == ErrorKind::NotFound => return Ok((dest, None)),
+        Err(e) => (false, e.kind() != ErrorKind::NotADirectory),
+    };
+
+    if not_empty && !args.force {
+        eprintln!(
+            "Destination '{}' exists and is not empty. Use --force to \
+             overwrite.",
+            dest.display()
+        );
+        return Err(ERR_DEST_EXISTS);
+    }
 
-        if not_empty && !args.force {
-            eprintln!(
-                "Destination '{}' exists and is not empty. Use --force to \
-                 overwrite.",
-                dest.display()
-            );
-            return Err(ERR_DEST_EXISTS);
-        }
+    let cleanup = args.force.then(|| {
+        let swapped = scratch_path(&dest)
+            .and_then(|scratch| rename(&dest, &scratch).ok().map(|_| scratch));
 
-        if args.force {
-            remove_dir_all(&dest).map_err(|_| ERR_CLEANUP_FAILED)?;
+        match swapped {
+            Some(scratch) => Cleanup::spawn(scratch, is_dir, false),
+            None => Cleanup::spawn(dest.clone(), is_dir, true),
         }
+    });
+
+    Ok((dest, cleanup))
+}
+
+fn scratch_path(dest: &Path) -> Option<PathBuf> {
+    let name = dest.file_name()?.to_string_lossy();
+    Some(dest.with_file_name(format!(".{}.old.{}", name, id())))
+}
+
+fn remove_dir_parallel(path: &Path) -> io::Result<()> {
+    if path.symlink_metadata()?.is_symlink() {
+        return remove_file(path);
     }
 
-    Ok(dest)
+    path.read_dir()?.par_bridge().try_for_each(|entry| {
+        let entry = entry?;
+
+        if entry.file_type()?.is_dir() {
+            remove_dir_all(entry.path())
+        } else {
+            remove_file(entry.path())
+        }
+    })?;
+
+    remove_dir(path)
 }
 
 fn determine_reference(
@@ -234,7 +438,15 @@ fn determine_reference(
         return b;
     }
 
-    match get_default_branch(client, owner, repo, token) {
+    let branch = get_default_branch(client, owner, repo, token).or_else(|e| {
+        if e.is::<RepoNotFound>() {
+            return Err(e);
+        }
+
+        ls_remote_default_branch(owner, repo).map_err(|_| e)
+    });
+
+    match branch {
         Ok(b) => {
             println!("Using default branch '{}'", b);
             b
@@ -255,12 +467,20 @@ fn download_archive(
     repo: &str,
     reference: &str,
     token: Option<&str>,
-    dest_dir: &Path,
-) -> Result<PathBuf, i32> {
-    match download_zip(client, owner, repo, reference, token, dest_dir) {
-        Ok(p) => {
-            println!("Downloaded archive to {}", p.display());
-            Ok(p)
+    spill_dir: &Path,
+) -> Result<Archive, i32> {
+    match download_zip(client, owner, repo, reference, token, spill_dir) {
+        Ok(archive) => {
+            match &archive {
+                Archive::Memory(data) => {
+                    println!("Downloaded archive ({} bytes)", data.len())
+                },
+                Archive::File(f) => println!(
+                    "Downloaded archive ({} bytes) to a temporary file",
+                    f.metadata().map(|m| m.len()).unwrap_or_default()
+                ),
+            }
+            Ok(archive)
         },
         Err(e) => {
             eprintln!("Failed to download repository archive: {}", e);
@@ -269,6 +489,43 @@ fn download_archive(
     }
 }
 
+#[derive(Debug)]
+struct RepoNotFound(String);
+
+impl fmt::Display for RepoNotFound {
+    fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
+        write!(f, "Repository {} not found (404).", self.0)
+    }
+}
+
+impl Error for RepoNotFound {}
+
+enum BranchLookup<'a> {
+    Cached(String),
+    GraphQl(&'a str),
+    Rest { etag: Option<&'a str> },
+}
+
+fn plan_branch_lookup<'a>(
+    cached: Option<&'a Value>,
+    token: Option<&'a str>,
+    now: u64,
+) -> BranchLookup<'a> {
+    let branch =
+        cached.and_then(|c| c.get("default_branch")).and_then(|b| b.as_str());
+    let etag = cached.and_then(|c| c.get("etag")).and_then(|e| e.as_str());
+    let fresh = cached
+        .and_then(|c| c.get("fetched_at"))
+        .and_then(|t| t.as_u64())
+        .is_some_and(|t| now.saturating_sub(t) < REPO_META_TTL_SECS);
+
+    match (branch, etag, token) {
+        (Some(b), _, _) if fresh => BranchLookup::Cached(b.to_string()),
+        (_, None, Some(t)) => BranchLookup::GraphQl(t),
+        _ => BranchLookup::Rest { etag },
+    }
+}
+
 fn get_default_branch(
     client: &Client,
     owner: &str,
@@ -276,128 +533,315 @@ fn get_default_branch(
     token: Option<&str>,
 ) -> anyhow::Result<String> {
     let url = format!("{}/repos/{}/{}", GITHUB_API, owner, repo);
-    let mut req = client.get(&url);
+    let key = format!("{}/{}", owner, repo);
+    let cache_path = repo_meta_cache_path();
+    let mut cache =
+        cache_path.as_deref().map_or_else(|| json!({}), load_repo_meta_cache);
+    let cached = cache.get(&key).cloned();
+    let plan = plan_branch_lookup(cached.as_ref(), token, unix_now_secs());
+
+    let etag = match plan {
+        BranchLookup::Cached(branch) => return Ok(branch),
+        BranchLookup::GraphQl(t) => {
+            if let Ok(branch) = graphql_default_branch(client, owner, repo, t) {
+                cache_repo_meta(
+                    cache_path.as_deref(),
+                    &mut cache,
+                    &key,
+                    json!({
+                        "default_branch": branch,
+                        "fetched_at": unix_now_secs(),
+                    }),
+                );
+                return Ok(branch);
+            }
 
-    if let Some(t) = token {
-        req = req.header("Authorization", format!("token {}", t));
+            None
+        },
+        BranchLookup::Rest { etag } => etag,
+    };
+
+    let mut etag = etag;
+
+    loop {
+        let mut req = authorize(client.get(&url), token);
+
+        if let Some(etag) = etag {
+            req = req.header(IF_NONE_MATCH, etag);
+        }
+
+        let res = send_with_retry(req.timeout(TIMEOUT_GET_REPO))?;
+
+        return match res.status().as_u16() {
+            200 => {
+                let etag = res
+                    .headers()
+                    .get(ETAG)
+                    .and_then(|e| e.to_str().ok())
+                    .map(|e| e.to_string());
+
+                let v: Value = res.json()?;
+                let branch = v
+                    .get("default_branch")
+                    .and_then(|b| b.as_str())
+                    .unwrap_or(DEFAULT_BRANCH)
+                    .to_string();
+
+                if let Some(etag) = etag {
+                    cache_repo_meta(
+                        cache_path.as_deref(),
+                        &mut cache,
+                        &key,
+                        json!({
+                            "etag": etag,
+                            "default_branch": branch,
+                            "fetched_at": unix_now_secs(),
+                        }),
+                    );
+                }
+
+                Ok(branch)
+            },
+            304 if etag.is_some() => {
+                let refreshed = cached
+                    .as_ref()
+                    .and_then(|c| revalidated_meta(c, unix_now_secs()));
+
+                let Some((branch, meta)) = refreshed else {
+                    // Nothing usable to revalidate; fetch the full body.
+                    etag = None;
+                    continue;
+                };
+
+                cache_repo_meta(cache_path.as_deref(), &mut cache, &key, meta);
+                Ok(branch)
+            },
+            404 => Err(RepoNotFound(format!("{}/{}", owner, repo)).into()),
+            s => Err(anyhow!(
+                "Failed to get repo info: {} {}",
+                s,
+                error_body(res)
+            )),
+        };
     }
+}
 
-    let res = req.timeout(TIMEOUT_GET_REPO).send()?;
+fn revalidated_meta(cached: &Value, now: u64) -> Option<(String, Value)> {
+    let etag = cached.get("etag").and_then(|e| e.as_str())?;
+    let branch = cached.get("default_branch").and_then(|b| b.as_str())?;
+    let meta = json!({
+        "etag": etag,
+        "default_branch": branch,
+        "fetched_at": now,
+    });
 
-    match res.status().as_u16() {
-        200 => {
-            let v: Value = res.json()?;
-            Ok(v.get("default_branch")
-                .and_then(|b| b.as_str())
-                .unwrap_or(DEFAULT_BRANCH)
-                .to_string())
-        },
-        404 => Err(anyhow!("Repository {}/{} not found (404).", owner, repo)),
-        s => {
-            let txt = res.text().unwrap_or_default();
-            Err(anyhow!("Failed to get repo info: {} {}", s, txt))
-        },
+    Some((branch.to_string(), meta))
+}
+
+fn graphql_default_branch(
+    client: &Client,
+    owner: &str,
+    repo: &str,
+    token: &str,
+) -> anyhow::Result<String> {
+    let body = json!({
+        "query": GRAPHQL_DEFAULT_BRANCH_QUERY,
+        "variables": { "owner": owner, "name": repo },
+    });
+    let url = format!("{}/graphql", GITHUB_API);
+    let req = authorize(client.post(&url), Some(token))
+        .json(&body)
+        .timeout(TIMEOUT_GET_REPO);
+    let res = send_with_retry(req)?;
+
+    if !res.status().is_success() {
+        return Err(anyhow!("GraphQL query failed: {}", res.status()));
     }
+
+    let v: Value = res.json()?;
+    v.pointer("/data/repository/defaultBranchRef/name")
+        .and_then(|b| b.as_str())
+        .map(|b| b.to_string())
+        .ok_or_else(|| anyhow!("GraphQL response has no default branch."))
+}
+
+fn ls_remote_default_branch(owner: &str, repo: &str) -> anyhow::Result<String> {
+    let url = format!("{}/{}/{}.git", GITHUB_WEB, owner, repo);
+    let timeout_ms = TIMEOUT_GET_REPO.as_millis() as i32;
+
+    unsafe {
+        opts::set_server_connect_timeout_in_milliseconds(timeout_ms)?;
+        opts::set_server_timeout_in_milliseconds(timeout_ms)?;
+    }
+
+    let mut proxy = ProxyOptions::new();
+    proxy.auto();
+    let mut remote = Remote::create_detached(url.as_str())?;
+    let mut conn = remote.connect_auth(Direction::Fetch, None, Some(proxy))?;
+    let head = conn.remote().default_branch()?;
+    let head = head
+        .as_str()
+        .ok_or_else(|| anyhow!("Remote HEAD of {} is not UTF-8.", url))?;
+
+    Ok(head.strip_prefix("refs/heads/").unwrap_or(head).to_string())
+}
+
+fn repo_meta_cache_path() -> Option<PathBuf> {
+    var("XDG_CACHE_HOME")
+        .ok()
+        .filter(|d| !d.is_empty())
+        .map(PathBuf::from)
+        .or_else(|| var("HOME").ok().map(|h| PathBuf::from(h).join(".cache")))
+        .map(|d| d.join(CACHE_DIR_NAME).join(REPO_META_CACHE_FILE))
+}
+
+fn load_repo_meta_cache(path: &Path) -> Value {
+    read_to_string(path)
+        .ok()
+        .and_then(|s| serde_json::from_str::<Value>(&s).ok())
+        .filter(|v| v.is_object())
+        .unwrap_or_else(|| json!({}))
+}
+
+fn store_repo_meta_cache(path: &Path, cache: &Value) -> anyhow::Result<()> {
+    let dir =
+        path.parent().ok_or_else(|| anyhow!("no cache directory available"))?;
+    create_dir_all(dir)?;
+
+    let mut tmp = NamedTempFile::new_in(dir)?;
+    tmp.write_all(&serde_json::to_vec(cache)?)?;
+    tmp.persist(path)?;
+    Ok(())
+}
+
+fn cache_repo_meta(
+    path: Option<&Path>,
+    cache: &mut Value,
+    key: &str,
+    meta: Value,
+) {
+    cache[key] = meta;
+
+    let Some(path) = path else {
+        return;
+    };
+
+    if let Err(e) = store_repo_meta_cache(path, cache) {
+        eprintln!("Warning: could not update repository metadata cache: {}", e);
+    }
+}
+
+fn unix_now_secs() -> u64 {
+    SystemTime::now()
+        .duration_since(SystemTime::UNIX_EPOCH)
+        .map(|d| d.as_secs())
+        .unwrap_or_default()
 }
 
 fn download_zip(
-    // TODO: this function might be broken, do we need `NamedTempFile`?
     client: &Client,
     owner: &str,
     repo: &str,
     reference: &str,
     token: Option<&str>,
-    dest_dir: &Path,
-) -> anyhow::Result<PathBuf> {
+    spill_dir: &Path,
+) -> anyhow::Result<Archive> {
     let url = format!(
-        "https://api.github.com/repos/{}/{}/zipball/{}",
-        owner, repo, reference
+        "{}/repos/{}/{}/zipball/{}",
+        GITHUB_API, owner, repo, reference
     );
 
-    let mut req = client.get(&url).header("Accept", ACCEPT_HEADER);
-
-    if let Some(t) = token {
-        req = req.header("Authorization", format!("token {}", t));
-    }
-
-    let mut resp = req.timeout(TIMEOUT_DOWNLOAD).send()?;
+    let req =
+        authorize(client.get(&url), token).header(ACCEPT_ENCODING, "identity");
+    let mut resp = send_with_retry(req.timeout(TIMEOUT_DOWNLOAD))?;
     let status = resp.status();
 
     if !status.is_success() {
-        return if status.as_u16() == 404 {
-            Err(anyhow!(
+        return Err(match status.as_u16() {
+            404 => anyhow!(
                 "Archive for {}/{}@{} not found (404).",
                 owner,
                 repo,
                 reference
-            ))
-        } else if status.is_redirection() {
-            Err(anyhow!("Unexpected redirect: {}", status))
-        } else {
-            Err(anyhow!("Failed to download archive: {}", status))
-        };
+            ),
+            300..=399 => anyhow!("Unexpected redirect: {}", status),
+            _ => anyhow!(
+                "Failed to download archive: {} {}",
+                status,
+                error_body(resp)
+            ),
+        });
     }
 
-    let ts = SystemTime::now().duration_since(SystemTime::UNIX_EPOCH)?;
-    let filename = format!("{}{}.zip", ARCHIVE_PREFIX, ts.as_nanos());
-    let path = dest_dir.join(filename);
-    let mut outfile = File::create(&path)?;
-    io::copy(&mut resp, &mut outfile)?;
-
-    Ok(path)
-}
-
-fn remove_embedded_git(dirpath: &Path) {
-    let mut builder = WalkBuilder::new(dirpath);
-    builder.standard_filters(false).hidden(false);
-
-    builder.build_parallel().run(|| {
-        Box::new(|res: Result<DirEntry, Error>| {
-            match res {
-                Ok(entry) => {
-                    if entry.file_type().map(|ft| ft.is_dir()).unwrap_or(false)
-                        && entry.file_name() == ".git"
-                    {
-                        let git_dir = entry.path().to_path_buf();
-                        match remove_dir_all(&git_dir) {
-                            Ok(_) => println!(
-                                "Removed embedded .git at {}",
-                                git_dir.display()
-                            ),
-                            Err(e) => eprintln!(
-                                "Warning: failed to remove embedded .git at \
-                                 {}: {}",
-                                git_dir.display(),
-                                e
-                            ),
-                        }
-                    }
-                },
-                Err(e) => eprintln!("Warning: walker error: {}", e),
-            }
-            Continue
-        })
-    });
+    let content_length = resp.content_length();
+    let mut head = Vec::new();
+
+    if content_length.is_none_or(|len| len <= IN_MEMORY_ARCHIVE_MAX) {
+        head.reserve(content_length.unwrap_or_default() as usize);
+        resp.by_ref().take(IN_MEMORY_ARCHIVE_MAX + 1).read_to_end(&mut head)?;
+
+        if head.len() as u64 <= IN_MEMORY_ARCHIVE_MAX {
+            return Ok(Archive::Memory(head));
+        }
+    }
+
+    let spill = tempfile_in(spill_dir).or_else(|_| tempfile())?;
+
+    if let Some(len) = content_length {
+        preallocate(&spill, len);
+    }
+
+    let mut outfile = BufWriter::with_capacity(DOWNLOAD_BUF_SIZE, spill);
+    outfile.write_all(&head)?;
+    drop(head);
+    resp.copy_to(&mut outfile)?;
+
+    Ok(Archive::File(outfile.into_inner()?))
 }
 
+#[cfg(target_os = "linux")]
+fn preallocate(file: &File, len: u64) {
+    use std::os::fd::AsRawFd;
+
+    // Best effort: KEEP_SIZE reserves extents without changing the length.
+    unsafe {
+        libc::fallocate(
+            file.as_raw_fd(),
+            libc::FALLOC_FL_KEEP_SIZE,
+            0,
+            len as libc::off_t,
+        );
+    }
+}
+
+#[cfg(not(target_os = "linux"))]
+fn preallocate(_file: &File, _len: u64) {}
+
 fn check_git_installed() -> Result<(), ()> {
-    match Command::new("git")
-        .arg("--version")
-        .stdout(Stdio::null())
-        .stderr(Stdio::null())
-        .status()
-    {
-        Ok(s) if s.success() => Ok(()),
-        _ => Err(()),
+    let found = var_os("PATH").is_some_and(|paths| {
+        split_paths(&paths).any(|dir| {
+            dir.join("git").metadata().is_ok_and(|m| {
+                m.is_file() && m.permissions().mode() & 0o111 != 0
+            })
+        })
+    });
+
+    if found {
+        Ok(())
+    } else {
+        Err(())
     }
 }
 
 fn initialize_repo(
     dest: &Path,
+    paths: &[PathBuf],
     author_name: Option<&str>,
     author_email: Option<&str>,
     remote: Option<&str>,
 ) -> anyhow::Result<()> {
+    opts::strict_object_creation(false);
+    opts::strict_hash_verification(false);
     let repo = Repository::init(dest)?;
 
     if author_name.is_some() || author_email.is_some() {
@@ -413,7 +857,11 @@ fn initialize_repo(
     }
 
     let mut index = repo.index()?;
-    index.add_all(["*"].iter(), IndexAddOption::DEFAULT, None)?;
+
+    for path in paths {
+        index.add_path(path)?;
+    }
+
     index.write()?;
     let tree_id = index.write_tree()?;
     let tree = repo.find_tree(tree_id)?;
@@ -446,3 +894,302 @@ fn initialize_repo(
         - async-compression — for async decompression pipelines if you move to
           async extraction.
 */
+
+#[cfg(test)]
+mod tests {
+    use std::{
+        ffi::OsStr,
+        fs::{read_dir, symlink_metadata},
+        io::Cursor,
+        os::unix::fs::symlink,
+    };
+
+    use git2::{ObjectType, TreeWalkMode, TreeWalkResult};
+    use zip::{write::SimpleFileOptions, ZipWriter};
+
+    use super::*;
+
+    fn force_args(dest: &Path) -> Args {
+        Args::parse_from([
+            OsStr::new("gitripper"),
+            OsStr::new("--force"),
+            OsStr::new("--dest"),
+            dest.as_os_str(),
+        ])
+    }
+
+    #[test]
+    fn test_prepare_destination_swaps_directory_aside() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let dest = temp_dir.path().join("repo-copy");
+        create_dir_all(dest.join("src/nested")).unwrap();
+        write(dest.join("README.md"), "old").unwrap();
+        write(dest.join("src/nested/lib.rs"), "old").unwrap();
+
+        let (path, cleanup) =
+            prepare_destination(&force_args(&dest), "repo").unwrap();
+        let cleanup = cleanup.unwrap();
+
+        assert_eq!(path, dest);
+        assert!(!cleanup.blocks_dest);
+        assert_eq!(Some(cleanup.path.clone()), scratch_path(&dest));
+        assert!(!dest.exists());
+
+        let scratch = cleanup.path.clone();
+        cleanup.wait().unwrap();
+        assert!(!scratch.exists());
+    }
+
+    #[test]
+    fn test_prepare_destination_swaps_file_aside() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let dest = temp_dir.path().join("repo-copy");
+        write(&dest, "not a directory").unwrap();
+
+        let (_, cleanup) =
+            prepare_destination(&force_args(&dest), "repo").unwrap();
+        let cleanup = cleanup.unwrap();
+        let scratch = cleanup.path.clone();
+
+        assert!(!cleanup.blocks_dest);
+        assert!(!dest.exists());
+        cleanup.wait().unwrap();
+        assert!(!scratch.exists());
+    }
+
+    #[test]
+    fn test_prepare_destination_symlink_keeps_target() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let target = temp_dir.path().join("target");
+        let dest = temp_dir.path().join("repo-copy");
+        create_dir_all(&target).unwrap();
+        write(target.join("keep.txt"), "keep").unwrap();
+        symlink(&target, &dest).unwrap();
+
+        let (_, cleanup) =
+            prepare_destination(&force_args(&dest), "repo").unwrap();
+        let cleanup = cleanup.unwrap();
+        let scratch = cleanup.path.clone();
+        cleanup.wait().unwrap();
+
+        assert!(symlink_metadata(&dest).is_err());
+        assert!(symlink_metadata(&scratch).is_err());
+        assert_eq!(read_to_string(target.join("keep.txt")).unwrap(), "keep");
+    }
+
+    #[test]
+    fn test_prepare_destination_rename_failure_blocks_dest() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let dest = temp_dir.path().join("repo-copy");
+        create_dir_all(&dest).unwrap();
+        write(dest.join("README.md"), "old").unwrap();
+
+        // A non-empty directory at the scratch path makes rename fail.
+        let scratch = scratch_path(&dest).unwrap();
+        create_dir_all(&scratch).unwrap();
+        write(scratch.join("occupied"), "").unwrap();
+
+        let (_, cleanup) =
+            prepare_destination(&force_args(&dest), "repo").unwrap();
+        let cleanup = cleanup.unwrap();
+
+        assert!(cleanup.blocks_dest);
+        assert_eq!(cleanup.path, dest);
+        cleanup.wait().unwrap();
+        assert!(!dest.exists());
+        assert!(scratch.join("occupied").exists());
+    }
+
+    #[test]
+    fn test_cleanup_joins_on_drop() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let doomed = temp_dir.path().join("doomed");
+        create_dir_all(doomed.join("a/b")).unwrap();
+        write(doomed.join("a/b/c.txt"), "x").unwrap();
+
+        drop(Cleanup::spawn(doomed.clone(), true, false));
+
+        assert!(!doomed.exists());
+    }
+
+    #[test]
+    fn test_remove_dir_parallel() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let dir = temp_dir.path().join("dir");
+        let target = temp_dir.path().join("target");
+        let link = temp_dir.path().join("link");
+
+        for i in 0..8 {
+            create_dir_all(dir.join(format!("d{}/sub", i))).unwrap();
+            write(dir.join(format!("d{}/sub/f.txt", i)), "x").unwrap();
+            write(dir.join(format!("f{}.txt", i)), "x").unwrap();
+        }
+
+        create_dir_all(&target).unwrap();
+        write(target.join("keep.txt"), "keep").unwrap();
+        symlink(&target, &link).unwrap();
+
+        remove_dir_parallel(&dir).unwrap();
+        remove_dir_parallel(&link).unwrap();
+
+        assert!(!dir.exists());
+        assert!(symlink_metadata(&link).is_err());
+        assert!(target.join("keep.txt").exists());
+    }
+
+    #[test]
+    fn test_initialize_repo_commits_extracted_paths() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let dest = temp_dir.path().join("repo-copy");
+        let mut zip = ZipWriter::new(Cursor::new(Vec::new()));
+        let files = [
+            ("user-repo-abc123/.gitignore", "*.log\n"),
+            ("user-repo-abc123/debug.log", "tracked anyway"),
+            ("user-repo-abc123/src/main.rs", "fn main() {}"),
+            ("user-repo-abc123/.git/config", "[core]"),
+            ("user-repo-abc123/vendor/.git/HEAD", "ref"),
+        ];
+
+        for (name, body) in files {
+            zip.start_file(name, SimpleFileOptions::default()).unwrap();
+            zip.write_all(body.as_bytes()).unwrap();
+        }
+
+        let data = zip.finish().unwrap().into_inner();
+        let paths = extract_zip_bytes(&data, &dest).unwrap();
+        initialize_repo(&dest, &paths, None, None, None).unwrap();
+
+        let repo = Repository::open(&dest).unwrap();
+        let tree = repo.head().unwrap().peel_to_tree().unwrap();
+        let mut committed = Vec::new();
+
+        tree.walk(TreeWalkMode::PreOrder, |root, entry| {
+            if entry.kind() == Some(ObjectType::Blob) {
+                committed.push(format!("{}{}", root, entry.name().unwrap()));
+            }
+            TreeWalkResult::Ok
+        })
+        .unwrap();
+
+        assert_eq!(committed, [".gitignore", "debug.log", "src/main.rs"]);
+    }
+
+    #[test]
+    fn test_plan_branch_lookup_fresh_cache() {
+        let now = 1_000_000;
+        let cached = json!({
+            "etag": "\"abc\"",
+            "default_branch": "develop",
+            "fetched_at": now - 5,
+        });
+
+        assert!(matches!(
+            plan_branch_lookup(Some(&cached), Some("t"), now),
+            BranchLookup::Cached(b) if b == "develop"
+        ));
+    }
+
+    #[test]
+    fn test_plan_branch_lookup_stale_cache_revalidates() {
+        let now = 1_000_000;
+        let cached = json!({
+            "etag": "\"abc\"",
+            "default_branch": "develop",
+            "fetched_at": now - REPO_META_TTL_SECS,
+        });
+
+        assert!(matches!(
+            plan_branch_lookup(Some(&cached), Some("t"), now),
+            BranchLookup::Rest {
+                etag: Some("\"abc\""),
+            }
+        ));
+    }
+
+    #[test]
+    fn test_revalidated_meta_is_fresh_again() {
+        let now = 1_000_000;
+        let cached = json!({
+            "etag": "\"abc\"",
+            "default_branch": "develop",
+            "fetched_at": now - REPO_META_TTL_SECS,
+        });
+        let (branch, meta) = revalidated_meta(&cached, now).unwrap();
+
+        assert_eq!(branch, "develop");
+        assert_eq!(meta["etag"], "\"abc\"");
+        assert_eq!(meta["fetched_at"], now);
+        assert!(matches!(
+            plan_branch_lookup(Some(&meta), Some("t"), now + 1),
+            BranchLookup::Cached(b) if b == "develop"
+        ));
+    }
+
+    #[test]
+    fn test_revalidated_meta_without_branch_refetches() {
+        let cached = json!({ "etag": "\"abc\"", "fetched_at": 0 });
+
+        assert!(revalidated_meta(&cached, 1_000_000).is_none());
+    }
+
+    #[test]
+    fn test_plan_branch_lookup_graphql_needs_token_and_no_etag() {
+        let now = 1_000_000;
+        let cached = json!({
+            "default_branch": "develop",
+            "fetched_at": now - REPO_META_TTL_SECS,
+        });
+
+        assert!(matches!(
+            plan_branch_lookup(Some(&cached), Some("t"), now),
+            BranchLookup::GraphQl("t")
+        ));
+        assert!(matches!(
+            plan_branch_lookup(None, Some("t"), now),
+            BranchLookup::GraphQl("t")
+        ));
+        assert!(matches!(
+            plan_branch_lookup(None, None, now),
+            BranchLookup::Rest { etag: None }
+        ));
+    }
+
+    #[test]
+    fn test_plan_branch_lookup_fresh_entry_without_branch() {
+        let now = 1_000_000;
+        let cached = json!({ "etag": "\"abc\"", "fetched_at": now });
+
+        assert!(matches!(
+            plan_branch_lookup(Some(&cached), None, now),
+            BranchLookup::Rest {
+                etag: Some("\"abc\""),
+            }
+        ));
+    }
+
+    #[test]
+    fn test_repo_meta_cache_round_trip() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let dir = temp_dir.path().join(CACHE_DIR_NAME);
+        let path = dir.join(REPO_META_CACHE_FILE);
+        let cache = json!({ "o/r": { "default_branch": "main" } });
+
+        store_repo_meta_cache(&path, &cache).unwrap();
+
+        assert_eq!(load_repo_meta_cache(&path), cache);
+        assert_eq!(read_dir(&dir).unwrap().count(), 1);
+    }
+
+    #[test]
+    fn test_repo_meta_cache_corrupt_file_loads_empty() {
+        let temp_dir = tempfile::tempdir().unwrap();
+        let path = temp_dir.path().join(REPO_META_CACHE_FILE);
+        write(&path, "{not json").unwrap();
+
+        assert_eq!(load_repo_meta_cache(&path), json!({}));
+        assert_eq!(
+            load_repo_meta_cache(&temp_dir.path().join("missing.json")),
+            json!({})
+        );
+    }
+}